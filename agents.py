@@ -1,15 +1,31 @@
 #!/usr/bin/env python3
+import hashlib
+import json
 import os
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Dict, List
+import httpx
+from cachetools import LRUCache
 from dotenv import load_dotenv
+from openai import AsyncOpenAI, OpenAI
 
 from agno.agent import Agent
+from agno.document import Document
 from agno.document.chunking.agentic import AgenticChunking
+from agno.document.chunking.fixed import FixedSizeChunking
 from agno.knowledge.pdf import PDFKnowledgeBase
 from agno.vectordb.lancedb import LanceDb
 from agno.vectordb.search import SearchType
 from agno.embedder.openai import OpenAIEmbedder
 from agno.models.openai import OpenAIChat
 from agno.team.team import Team
+from lancedb.table import LanceTable
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,57 +40,239 @@ if not lance_url or not lance_api_key:
 # Default model
 default_model_id = "o3-mini"
 
+# HNSW index parameters for the vector tables (override via environment to retune without code changes).
+# Only local tables honour these; LanceDB Cloud tunes its index parameters itself.
+hnsw_m = int(os.environ.get("HNSW_M", 24))
+hnsw_ef_construction = int(os.environ.get("HNSW_EF_CONSTRUCTION", 128))
+# Candidate list size at query time; unlike the build parameters this also applies on LanceDB Cloud
+hnsw_ef_search = int(os.environ.get("HNSW_EF_SEARCH", 100))
+
+# Chunking settings: fixed-size chunks with ~15% overlap by default. agno's FixedSizeChunking counts
+# characters, so 2048 characters is roughly 512 tokens. USE_AGENTIC_CHUNKING=1 switches to
+# LLM-driven chunking for a one-off high-quality reindex (run with load_knowledge_bases(recreate=True),
+# since chunks are deduplicated by content and old chunks would otherwise stay next to the new ones).
+chunk_size = int(os.environ.get("CHUNK_SIZE", 2048))
+chunk_overlap = int(os.environ.get("CHUNK_OVERLAP", 300))
+use_agentic_chunking = os.environ.get("USE_AGENTIC_CHUNKING", "0") == "1"
+
+def create_chunking_strategy():
+    """Return the chunking strategy used when loading PDFs."""
+    if use_agentic_chunking:
+        return AgenticChunking()
+    return FixedSizeChunking(chunk_size=chunk_size, overlap=chunk_overlap)
+
+# OpenAI Batch API settings for bulk reloads (the state file lets interrupted reloads resume their batch)
+embedding_batch_state_path = os.environ.get("EMBEDDING_BATCH_STATE", ".embedding_batches.sqlite")
+embedding_batch_poll_interval = int(os.environ.get("EMBEDDING_BATCH_POLL_INTERVAL", 30))
+# Per-job limits of the Batch API for /v1/embeddings (50,000 inputs, 200MB input file); leave headroom on size
+embedding_batch_max_inputs = 50_000
+embedding_batch_max_bytes = 190 * 1024 * 1024
+
+@dataclass
+class BatchedOpenAIEmbedder(OpenAIEmbedder):
+    """OpenAI embedder that can embed many chunks per request ahead of insertion."""
+
+    batch_size: int = 2048  # OpenAI limit on inputs per embeddings request
+    batch_max_tokens: int = 250_000  # Stay under the per-request token limit
+    max_concurrency: int = 4
+    prefetched: Dict[str, List[float]] = field(default_factory=dict, repr=False)
+    # Query embeddings keyed by text hash, so repeated searches skip the embeddings request. Stored as
+    # float32 arrays (~6KB for 1536 dimensions instead of ~49KB as a list of floats), so 4096 entries
+    # cost ~25MB per worker while still covering the hot set of repeated queries.
+    cache: LRUCache = field(default_factory=lambda: LRUCache(maxsize=4096), repr=False, compare=False)
+    cache_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def _batches(self, texts):
+        """Group texts into batches that respect the input and token limits."""
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = len(text) // 4 + 1  # Rough estimate of ~4 characters per token
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.batch_max_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _embed_batch(self, texts):
+        response = self.response(text=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    def prefetch(self, texts):
+        """Embed texts in batched, concurrent requests and keep the results for the next lookups."""
+        texts = [text for text in dict.fromkeys(texts) if text not in self.prefetched]
+        batches = list(self._batches(texts))
+        if not batches:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            for batch, embeddings in zip(batches, executor.map(self._embed_batch, batches)):
+                self.prefetched.update(zip(batch, embeddings))
+
+    def get_embedding(self, text):
+        embedding = self.prefetched.pop(text, None)
+        if embedding is not None:
+            return embedding
+
+        key = hashlib.blake2b(text.encode()).digest()
+        with self.cache_lock:
+            cached = self.cache.get(key)
+        if cached is not None:
+            return cached.tolist()
+        embedding = super().get_embedding(text)
+        if embedding:
+            with self.cache_lock:
+                self.cache[key] = array("f", embedding)
+        return embedding
+
+    def get_embedding_and_usage(self, text):
+        embedding = self.prefetched.pop(text, None)
+        if embedding is not None:
+            return embedding, None
+        return super().get_embedding_and_usage(text)
+
+class TunedLanceDb(LanceDb):
+    """LanceDb whose vector and hybrid searches use the HNSW_EF_SEARCH candidate list size."""
+
+    def vector_search(self, query: str, limit: int = 5) -> List[Document]:
+        query_embedding = self.embedder.get_embedding(query)
+        if query_embedding is None:
+            print(f"Error getting embedding for query: {query}")
+            return []
+        if self.table is None:
+            print("Table not initialized. Please create the table first")
+            return []
+
+        results = self.table.search(query=query_embedding, vector_column_name=self._vector_col).limit(limit).ef(hnsw_ef_search)
+        if self.nprobes:
+            results.nprobes(self.nprobes)
+        search_results = self._build_search_results(results.to_pandas())
+
+        if self.reranker:
+            search_results = self.reranker.rerank(query=query, documents=search_results)
+        return search_results
+
+    def hybrid_search(self, query: str, limit: int = 5) -> List[Document]:
+        query_embedding = self.embedder.get_embedding(query)
+        if query_embedding is None:
+            print(f"Error getting embedding for query: {query}")
+            return []
+        if self.table is None:
+            print("Table not initialized. Please create the table first")
+            return []
+        if not self.fts_index_exists:
+            create_fts_index(self)
+
+        results = (
+            self.table.search(vector_column_name=self._vector_col, query_type="hybrid")
+            .vector(query_embedding)
+            .text(query)
+            .limit(limit)
+            .ef(hnsw_ef_search)
+        )
+        if self.nprobes:
+            results.nprobes(self.nprobes)
+        search_results = self._build_search_results(results.to_pandas())
+
+        if self.reranker:
+            search_results = self.reranker.rerank(query=query, documents=search_results)
+        return search_results
+
+# Helper function to tell local LanceDB tables apart from LanceDB Cloud ones
+def is_local_table(vector_db):
+    """Return True if vector_db is backed by a local LanceTable rather than a LanceDB Cloud table."""
+    return isinstance(vector_db.table, LanceTable)
+
+# Helper function to check whether a table already has a full-text index
+def has_fts_index(vector_db):
+    """Return True if the table behind vector_db has an FTS index.
+
+    Local tables default to tantivy indexes, which live in the table's _indices/fts directory and
+    never show up in list_indices(), so check for that directory first.
+    """
+    try:
+        if is_local_table(vector_db) and vector_db.table._get_fts_index_path()[2]:
+            return True
+        return any("FTS" in str(index.index_type).upper() for index in vector_db.table.list_indices())
+    except Exception:
+        return False
+
 # Initialize vector databases with cloud storage
+# Hybrid search fuses vector and full-text results with LanceDB's default RRF reranker (k=60)
 try:
-    safety_vector_db = LanceDb(
+    # Shared OpenAI clients so every model and embedder reuses one keep-alive connection pool
+    openai_http_limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    shared_http = httpx.Client(http2=True, limits=openai_http_limits)
+    shared_async_http = httpx.AsyncClient(http2=True, limits=openai_http_limits)
+    shared_openai_client = OpenAI(http_client=shared_http)
+    shared_async_openai_client = AsyncOpenAI(http_client=shared_async_http)
+
+    # One embedder for both knowledge bases, so a team query that searches both is embedded once
+    shared_embedder = BatchedOpenAIEmbedder(id="text-embedding-3-small", openai_client=shared_openai_client)
+
+    safety_vector_db = TunedLanceDb(
         table_name="safety_standards",
         uri=lance_url,
         api_key=lance_api_key,
         search_type=SearchType.hybrid,
-        embedder=OpenAIEmbedder(id="text-embedding-3-small")
+        embedder=shared_embedder
     )
 
-    quality_vector_db = LanceDb(
+    quality_vector_db = TunedLanceDb(
         table_name="quality_standards",
         uri=lance_url,
         api_key=lance_api_key,
         search_type=SearchType.hybrid,
-        embedder=OpenAIEmbedder(id="text-embedding-3-small")
+        embedder=shared_embedder
     )
 
+    # Reuse existing FTS indexes instead of letting the first hybrid query rebuild them
+    safety_vector_db.fts_index_exists = has_fts_index(safety_vector_db)
+    quality_vector_db.fts_index_exists = has_fts_index(quality_vector_db)
+
     # Initialize knowledge bases
     safety_knowledge_base = PDFKnowledgeBase(
         path="data/pdfs",
         vector_db=safety_vector_db,
-        chunking_strategy=AgenticChunking(),
+        chunking_strategy=create_chunking_strategy(),
     )
 
     quality_knowledge_base = PDFKnowledgeBase(
         path="data/Quality PDF",
         vector_db=quality_vector_db,
-        chunking_strategy=AgenticChunking(),
+        chunking_strategy=create_chunking_strategy(),
     )
 
-    # Create individual agents
-    SafetyAgent = Agent(
-        name="Safety Standards Agent",
-        role="You are an expert on safety standards and protocols. Always provide your response in a concise manner based on the information provided in the documents.",
-        model=OpenAIChat(id=default_model_id),
-        knowledge=safety_knowledge_base,
-        search_knowledge=True,
-        show_tool_calls=False,
-        markdown=True,
-    )
+    # Factories for the individual agents. Each call returns a fresh instance, since agno keeps per-run
+    # state (run_id, run_response, messages) on the agent itself.
+    def create_model(model_id=None):
+        return OpenAIChat(id=model_id or default_model_id, client=shared_openai_client, async_client=shared_async_openai_client)
 
-    QualityAgent = Agent(
-        name="Quality Standards Agent",
-        role="You are an expert on quality standards and quality assurance processes. Always provide your response in a concise manner based on the information provided in the documents.",
-        model=OpenAIChat(id=default_model_id),
-        knowledge=quality_knowledge_base,
-        search_knowledge=True,
-        show_tool_calls=False,
-        markdown=True,
-    )
+    def create_safety_agent(model_id=None):
+        return Agent(
+            name="Safety Standards Agent",
+            role="You are an expert on safety standards and protocols. Always provide your response in a concise manner based on the information provided in the documents.",
+            model=create_model(model_id),
+            knowledge=safety_knowledge_base,
+            search_knowledge=True,
+            show_tool_calls=False,
+            markdown=True,
+        )
+
+    def create_quality_agent(model_id=None):
+        return Agent(
+            name="Quality Standards Agent",
+            role="You are an expert on quality standards and quality assurance processes. Always provide your response in a concise manner based on the information provided in the documents.",
+            model=create_model(model_id),
+            knowledge=quality_knowledge_base,
+            search_knowledge=True,
+            show_tool_calls=False,
+            markdown=True,
+        )
+
+    # Create individual agents
+    SafetyAgent = create_safety_agent()
+    QualityAgent = create_quality_agent()
 
     # Define instructions for team modes
     collaborate_instructions = [
@@ -120,20 +318,25 @@ try:
         }
     }
 
-    # Create team agent (using collaborate mode by default)
-    TeamAgent = Team(
-        name="Standards Team",
-        mode="collaborate",
-        model=OpenAIChat(id=default_model_id),
-        members=[SafetyAgent, QualityAgent],
-        share_member_interactions=True,
-        show_tool_calls=False,
-        markdown=True,
-        description="You are a collaborative team where all members work on the same task to create comprehensive responses.",
-        instructions=collaborate_instructions,
-        show_members_responses=True,
-        debug_mode=False,
-    )
+    # Build a team for the given mode (the API builds one per request). Every team gets its own
+    # member agents, so team runs never share run state with the direct endpoints.
+    def create_team(mode, model_id=None):
+        return Team(
+            name="Standards Team",
+            mode=mode,
+            model=create_model(model_id),
+            members=[create_safety_agent(model_id), create_quality_agent(model_id)],
+            share_member_interactions=True,
+            show_tool_calls=False,
+            markdown=True,
+            description=TEAM_INSTRUCTIONS[mode]["description"],
+            instructions=TEAM_INSTRUCTIONS[mode]["instructions"],
+            show_members_responses=True,
+            debug_mode=False,
+        )
+
+    # Default team agent (collaborate mode)
+    TeamAgent = create_team("collaborate")
 
     # For convenience, create a dictionary of available agents
     AGENTS = {
@@ -150,29 +353,221 @@ except Exception as e:
     import traceback
     print(f"Error initializing agents: {str(e)}")
     traceback.print_exc()
+
+    # Release any connections opened before the failure; main.py retries the import, and each attempt
+    # would otherwise leak a pool. The async client is not used during initialization, so it holds none.
+    if "shared_http" in globals():
+        shared_http.close()
     
     # Create empty objects for graceful failure
     AGENTS = {}
     TEAM_INSTRUCTIONS = {}
+    shared_openai_client = None
+    shared_async_openai_client = None
     SafetyAgent = None
     QualityAgent = None
     TeamAgent = None
+    create_safety_agent = None
+    create_quality_agent = None
+    create_team = None
     
     # Function to check if agents are available
     def are_agents_available():
         return False
 
+# Helper function to check whether a table already has the HNSW vector index
+def has_vector_index(vector_db):
+    """Return True if the table behind vector_db has an IVF_HNSW_SQ index."""
+    try:
+        return any("IVF_HNSW_SQ" in str(index.index_type).upper() for index in vector_db.table.list_indices())
+    except Exception:
+        return False
+
+# Helper function to build the HNSW vector index on a table
+def create_vector_index(vector_db):
+    """Create an IVF_HNSW_SQ index on the vector column.
+
+    HNSW_M and HNSW_EF_CONSTRUCTION are only passed for local tables: LanceDB Cloud's create_index
+    does not accept them and always replaces the existing index, so an existing index is left alone
+    (Cloud keeps it up to date as rows are added).
+    """
+    if has_vector_index(vector_db):
+        print(f"Vector index already exists for {vector_db.table_name}")
+        return
+    index_params = {"metric": "cosine", "vector_column_name": "vector", "index_type": "IVF_HNSW_SQ"}
+    if is_local_table(vector_db):
+        index_params.update(m=hnsw_m, ef_construction=hnsw_ef_construction, replace=False)
+    try:
+        vector_db.table.create_index(**index_params)
+        print(f"Vector index created for {vector_db.table_name}")
+    except Exception as e:
+        # Local table already has an index (replace=False) or the table is still empty
+        print(f"Skipping vector index creation for {vector_db.table_name}: {str(e)}")
+
+# Helper function to build the full-text index used by hybrid search
+def create_fts_index(vector_db):
+    """(Re)build the FTS index over document payloads so exact-token queries match.
+
+    use_tantivy is only passed for local tables: LanceDB Cloud builds its own FTS index and does not accept it.
+    """
+    fts_params = {"replace": True}
+    if is_local_table(vector_db):
+        fts_params["use_tantivy"] = vector_db.use_tantivy
+    try:
+        vector_db.table.create_fts_index("payload", **fts_params)
+        vector_db.fts_index_exists = True
+        print(f"FTS index created for {vector_db.table_name}")
+    except Exception as e:
+        print(f"Failed to create FTS index for {vector_db.table_name}: {str(e)}")
+
+# Helper function to embed texts through the OpenAI Batch API
+def split_batch_jobs(embedder, texts):
+    """Group embedding requests into batch jobs that stay within the Batch API input and file size limits.
+
+    Returns the request lines of each job and the texts of every request, indexed by custom_id.
+    """
+    jobs, requests = [], []
+    job_inputs = job_bytes = 0
+    for batch_texts in embedder._batches(texts):
+        body = {"model": embedder.id, "input": batch_texts, "encoding_format": "float"}
+        if embedder.id.startswith("text-embedding-3"):
+            body["dimensions"] = embedder.dimensions
+        line = json.dumps({"custom_id": str(len(requests)), "method": "POST", "url": "/v1/embeddings", "body": body})
+        line_bytes = len(line.encode()) + 1
+        if not jobs or job_inputs + len(batch_texts) > embedding_batch_max_inputs or job_bytes + line_bytes > embedding_batch_max_bytes:
+            jobs.append([])
+            job_inputs = job_bytes = 0
+        jobs[-1].append(line)
+        requests.append(batch_texts)
+        job_inputs += len(batch_texts)
+        job_bytes += line_bytes
+    return jobs, requests
+
+def embed_with_batch_api(embedder, job_name, texts):
+    """Embed texts with OpenAI batch jobs, resuming previously submitted jobs for the same texts.
+
+    Texts are split across as many jobs as the Batch API limits require; each job is tracked in the state
+    file separately so an interrupted reload only resubmits the jobs that did not complete.
+    """
+    client = embedder.client
+    jobs, requests = split_batch_jobs(embedder, sorted(set(texts)))
+
+    with closing(sqlite3.connect(embedding_batch_state_path)) as state:
+        state.execute(
+            "CREATE TABLE IF NOT EXISTS batch_jobs "
+            "(job_name TEXT, part INTEGER, fingerprint TEXT, batch_id TEXT, PRIMARY KEY (job_name, part))"
+        )
+        state.execute("DELETE FROM batch_jobs WHERE job_name = ? AND part >= ?", (job_name, len(jobs)))
+        state.commit()
+
+        # Submit (or resume) every job first so they run concurrently on OpenAI's side
+        submitted = []
+        for part, lines in enumerate(jobs):
+            fingerprint = hashlib.md5("\n".join(lines).encode()).hexdigest()
+            row = state.execute(
+                "SELECT batch_id FROM batch_jobs WHERE job_name = ? AND part = ? AND fingerprint = ?",
+                (job_name, part, fingerprint),
+            ).fetchone()
+            batch = client.batches.retrieve(row[0]) if row else None
+
+            if batch is None or batch.status in ("failed", "expired", "cancelled"):
+                input_file = client.files.create(file=(f"{job_name}-{part}.jsonl", "\n".join(lines).encode()), purpose="batch")
+                batch = client.batches.create(input_file_id=input_file.id, endpoint="/v1/embeddings", completion_window="24h")
+                state.execute("INSERT OR REPLACE INTO batch_jobs VALUES (?, ?, ?, ?)", (job_name, part, fingerprint, batch.id))
+                state.commit()
+                print(f"Submitted embedding batch {batch.id} for {job_name} (part {part + 1}/{len(jobs)})")
+            else:
+                print(f"Resuming embedding batch {batch.id} for {job_name} (part {part + 1}/{len(jobs)})")
+            submitted.append((part, batch))
+
+        for part, batch in submitted:
+            while batch.status not in ("completed", "failed", "expired", "cancelled"):
+                time.sleep(embedding_batch_poll_interval)
+                batch = client.batches.retrieve(batch.id)
+
+            if batch.status != "completed":
+                raise RuntimeError(f"Embedding batch {batch.id} ended with status '{batch.status}'")
+
+            # A completed batch has no output file when every request in it failed; its texts (like any
+            # failed lines) fall back to per-request embedding on insert
+            if batch.output_file_id is None:
+                print(f"Embedding batch {batch.id} produced no output; falling back to per-request embedding")
+            else:
+                for line in client.files.content(batch.output_file_id).text.splitlines():
+                    result = json.loads(line)
+                    if result.get("response", {}).get("status_code") != 200:
+                        continue
+                    batch_texts = requests[int(result["custom_id"])]
+                    for item in result["response"]["body"]["data"]:
+                        embedder.prefetched[batch_texts[item["index"]]] = item["embedding"]
+
+            state.execute("DELETE FROM batch_jobs WHERE job_name = ? AND part = ?", (job_name, part))
+            state.commit()
+
+# Helper function to load a knowledge base with batched embedding requests
+def load_knowledge_base_batched(knowledge_base, async_batch=False, recreate=False):
+    """Load new documents into a knowledge base, embedding chunks in batches instead of one request each.
+
+    With async_batch=True all chunks are embedded by OpenAI batch jobs and inserted in one call.
+    With recreate=True the table is dropped first, so a re-chunked reload replaces the old chunks.
+    Returns the number of documents inserted.
+    """
+    vector_db = knowledge_base.vector_db
+    embedder = vector_db.embedder
+    if recreate:
+        print(f"Dropping {vector_db.table_name} before reloading")
+        vector_db.drop()
+        vector_db.fts_index_exists = False
+    if not vector_db.exists():
+        vector_db.create()
+
+    pending = []
+    seen_content = set()
+    inserted = 0
+
+    def flush():
+        nonlocal inserted
+        if async_batch:
+            embed_with_batch_api(embedder, vector_db.table_name, [doc.content for doc in pending])
+        else:
+            embedder.prefetch([doc.content for doc in pending])
+        vector_db.insert(documents=pending)
+        inserted += len(pending)
+        pending.clear()
+
+    for document_list in knowledge_base.document_lists:
+        for doc in document_list:
+            if doc.content not in seen_content and not vector_db.doc_exists(doc):
+                seen_content.add(doc.content)
+                pending.append(doc)
+        if not async_batch and len(pending) >= embedder.batch_size * embedder.max_concurrency:
+            flush()
+    if pending:
+        flush()
+    return inserted
+
 # Helper function to load data into knowledge bases if needed
-def load_knowledge_bases(reload_safety=False, reload_quality=False):
-    """Load data into knowledge bases."""
+def load_knowledge_bases(reload_safety=False, reload_quality=False, async_batch=False, recreate=False):
+    """Load data into knowledge bases.
+
+    Set async_batch=True to embed through the OpenAI Batch API, which is cheaper for large reloads.
+    Set recreate=True after changing CHUNK_SIZE, CHUNK_OVERLAP or USE_AGENTIC_CHUNKING: the reloaded
+    knowledge bases are dropped and rebuilt instead of getting a second, differently chunked copy.
+    """
     if reload_safety:
         print("Loading safety documents into knowledge base...")
-        safety_knowledge_base.load(recreate=False)  # False for cloud storage
+        # Skip the index build when nothing new was inserted; on LanceDB Cloud it would rebuild the whole index
+        if load_knowledge_base_batched(safety_knowledge_base, async_batch=async_batch, recreate=recreate):
+            create_vector_index(safety_vector_db)
+        create_fts_index(safety_vector_db)
         print("Safety documents loaded successfully!")
     
     if reload_quality:
         print("Loading quality documents into knowledge base...")
-        quality_knowledge_base.load(recreate=False)  # False for cloud storage
+        # Skip the index build when nothing new was inserted; on LanceDB Cloud it would rebuild the whole index
+        if load_knowledge_base_batched(quality_knowledge_base, async_batch=async_batch, recreate=recreate):
+            create_vector_index(quality_vector_db)
+        create_fts_index(quality_vector_db)
         print("Quality documents loaded successfully!")
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import sys
 import os
@@ -17,23 +18,66 @@ class Colors:
 
 API_URL = "http://localhost:8080"
 MODEL_ID = "o3-mini"  # Default model ID
+REQUEST_TIMEOUT = 300  # Agent responses can take a while
+
+# Reuse one keep-alive connection pool for all API calls
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.headers["Connection"] = "keep-alive"
+
+# Windows consoles need colorama to interpret ANSI escape codes; without it, fall back to `cls`
+ANSI_CLEAR = True
+if os.name == 'nt':
+    try:
+        import colorama
+        colorama.init()
+    except ImportError:
+        ANSI_CLEAR = False
+
+# ANSI escape that clears the screen and moves the cursor home
+CLEAR_SCREEN = "\033[2J\033[H"
+
+# Pre-rendered screen text, built once instead of on every redraw
+HEADER_STR = (
+    f"{Colors.BOLD}{Colors.HEADER}{'=' * 50}{Colors.ENDC}\n"
+    f"{Colors.BOLD}{Colors.HEADER}  STANDARDS AGENTS API CONSOLE{Colors.ENDC}\n"
+    f"{Colors.BOLD}{Colors.HEADER}{'=' * 50}{Colors.ENDC}\n"
+)
+
+MENU_STR = (
+    f"{Colors.BOLD}Choose an agent to ask a question:{Colors.ENDC}\n"
+    f"{Colors.BLUE}1. Safety Agent{Colors.ENDC}\n"
+    f"{Colors.GREEN}2. Quality Agent{Colors.ENDC}\n"
+    f"{Colors.YELLOW}3. Team Agent{Colors.ENDC}\n"
+    f"{Colors.RED}4. Exit{Colors.ENDC}\n"
+)
+MENU_PROMPT = f"{Colors.BOLD}Select option (1-4): {Colors.ENDC}"
+
+TEAM_MODE_MENU_STR = (
+    f"\n{Colors.BOLD}Choose team mode:{Colors.ENDC}\n"
+    f"{Colors.BLUE}1. Collaborate{Colors.ENDC}\n"
+    f"{Colors.GREEN}2. Route{Colors.ENDC}\n"
+    f"{Colors.YELLOW}3. Coordinate{Colors.ENDC}"
+)
+TEAM_MODE_PROMPT = f"{Colors.BOLD}Select mode (1-3, default is 1): {Colors.ENDC}"
 
 def clear_screen():
     """Clear the console screen."""
-    os.system('cls' if os.name == 'nt' else 'clear')
+    if not ANSI_CLEAR:
+        os.system('cls')
+        return
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
 
 def print_header():
     """Print the application header."""
     clear_screen()
-    print(f"{Colors.BOLD}{Colors.HEADER}{'=' * 50}{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.HEADER}  STANDARDS AGENTS API CONSOLE{Colors.ENDC}")
-    print(f"{Colors.BOLD}{Colors.HEADER}{'=' * 50}{Colors.ENDC}")
-    print()
+    print(HEADER_STR)
 
 def check_api_health():
     """Check if the API is accessible."""
     try:
-        response = requests.get(f"{API_URL}/health", timeout=5)
+        response = SESSION.get(f"{API_URL}/health", timeout=5)
         if response.status_code == 200:
             data = response.json()
             if data.get("status") == "healthy":
@@ -44,13 +88,40 @@ def check_api_health():
 
 def display_menu(agents):
     """Display the main menu with agent options."""
-    print(f"{Colors.BOLD}Choose an agent to ask a question:{Colors.ENDC}")
-    print(f"{Colors.BLUE}1. Safety Agent{Colors.ENDC}")
-    print(f"{Colors.GREEN}2. Quality Agent{Colors.ENDC}")
-    print(f"{Colors.YELLOW}3. Team Agent{Colors.ENDC}")
-    print(f"{Colors.RED}4. Exit{Colors.ENDC}")
-    print()
-    return input(f"{Colors.BOLD}Select option (1-4): {Colors.ENDC}")
+    print(MENU_STR)
+    return input(MENU_PROMPT)
+
+def stream_answer(path, payload, agent_name, color):
+    """Send a query and print the answer as it streams in. Returns the full answer."""
+    response = SESSION.post(f"{API_URL}{path}", json=payload, stream=True, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    print(f"\n{color}{'=' * 50}{Colors.ENDC}")
+    print(f"{color}{Colors.BOLD}{agent_name} Response:{Colors.ENDC}")
+    print(f"{color}{'=' * 50}{Colors.ENDC}")
+
+    # The API sends server-sent events: "data: {...}" lines, an optional "event: error" line, and "data: [DONE]"
+    parts = []
+    event = None
+    with response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = None
+            elif line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                message = json.loads(data)
+                if event == "error":
+                    raise requests.RequestException(message.get("detail", "Unknown error"))
+                print(message["content"], end="", flush=True)
+                parts.append(message["content"])
+
+    print("" if parts else "No response received")
+    print(f"{color}{'=' * 50}{Colors.ENDC}")
+    return "".join(parts)
 
 def ask_safety_agent(query):
     """Send a query to the safety agent."""
@@ -58,8 +129,7 @@ def ask_safety_agent(query):
         "query": query,
         "model_id": MODEL_ID
     }
-    response = requests.post(f"{API_URL}/safety/ask", json=payload)
-    return response.json()
+    return stream_answer("/safety/ask", payload, "Safety Agent", Colors.BLUE)
 
 def ask_quality_agent(query):
     """Send a query to the quality agent."""
@@ -67,17 +137,13 @@ def ask_quality_agent(query):
         "query": query,
         "model_id": MODEL_ID
     }
-    response = requests.post(f"{API_URL}/quality/ask", json=payload)
-    return response.json()
+    return stream_answer("/quality/ask", payload, "Quality Agent", Colors.GREEN)
 
 def ask_team_agent(query):
     """Send a query to the team agent."""
     # Ask for team mode
-    print(f"\n{Colors.BOLD}Choose team mode:{Colors.ENDC}")
-    print(f"{Colors.BLUE}1. Collaborate{Colors.ENDC}")
-    print(f"{Colors.GREEN}2. Route{Colors.ENDC}")
-    print(f"{Colors.YELLOW}3. Coordinate{Colors.ENDC}")
-    mode_choice = input(f"{Colors.BOLD}Select mode (1-3, default is 1): {Colors.ENDC}")
+    print(TEAM_MODE_MENU_STR)
+    mode_choice = input(TEAM_MODE_PROMPT)
     
     team_mode = "collaborate"
     if mode_choice == "2":
@@ -90,8 +156,7 @@ def ask_team_agent(query):
         "model_id": MODEL_ID,
         "team_mode": team_mode
     }
-    response = requests.post(f"{API_URL}/team/ask", json=payload)
-    return response.json(), team_mode
+    return stream_answer("/team/ask", payload, f"Team Agent ({team_mode.capitalize()})", Colors.YELLOW), team_mode
 
 def main():
     """Main application logic."""
@@ -131,25 +196,13 @@ def main():
         # Process the query based on chosen agent
         print(f"\n{Colors.BLUE}Sending request...{Colors.ENDC}")
         try:
+            # Answers are printed as they stream in
             if choice == "1":
-                result = ask_safety_agent(query)
-                agent_name = "Safety Agent"
-                color = Colors.BLUE
+                ask_safety_agent(query)
             elif choice == "2":
-                result = ask_quality_agent(query)
-                agent_name = "Quality Agent"
-                color = Colors.GREEN
+                ask_quality_agent(query)
             else:
-                result, team_mode = ask_team_agent(query)
-                agent_name = f"Team Agent ({team_mode.capitalize()})"
-                color = Colors.YELLOW
-            
-            # Display the result
-            print(f"\n{color}{'=' * 50}{Colors.ENDC}")
-            print(f"{color}{Colors.BOLD}{agent_name} Response:{Colors.ENDC}")
-            print(f"{color}{'=' * 50}{Colors.ENDC}")
-            print(result.get("response", "No response received"))
-            print(f"{color}{'=' * 50}{Colors.ENDC}")
+                ask_team_agent(query)
         except requests.RequestException as e:
             print(f"\n{Colors.RED}Error: Failed to get response from API: {str(e)}{Colors.ENDC}")
         
@@ -1,11 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import msgspec
 from typing import Dict, Any, Optional
-from agno.models.openai import OpenAIChat
+import hashlib
+import json
+from cachetools import TTLCache
 
 # Import the agents from our agents.py file
-from agents import SafetyAgent, QualityAgent, TeamAgent, AGENTS, TEAM_INSTRUCTIONS
+from agents import AGENTS, TEAM_INSTRUCTIONS, create_safety_agent, create_quality_agent, create_team
 
 # Create the FastAPI app
 app = FastAPI(
@@ -23,63 +27,135 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Define request models
-class QueryRequest(BaseModel):
+# Define request models (decoded with msgspec, which is much cheaper than Pydantic validation)
+class QueryRequest(msgspec.Struct):
     query: str
     model_id: Optional[str] = None
 
-class TeamQueryRequest(BaseModel):
+class TeamQueryRequest(msgspec.Struct):
     query: str
     model_id: Optional[str] = None
     team_mode: Optional[str] = "collaborate"  # Default to collaborate, can be "route" or "coordinate"
 
+# Pydantic shadow models, used only to document the request bodies in the OpenAPI schema
+class QueryRequestSchema(BaseModel):
+    query: str
+    model_id: Optional[str] = None
+
+class TeamQueryRequestSchema(BaseModel):
+    query: str
+    model_id: Optional[str] = None
+    team_mode: Optional[str] = "collaborate"
+
+def request_body_schema(schema_model):
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema_model.model_json_schema()}}}}
+
+async def decode_request(raw_request: Request, request_type):
+    """Decode and validate a JSON request body into request_type."""
+    try:
+        return msgspec.json.decode(await raw_request.body(), type=request_type)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+# Cache of recent answers so repeated queries skip retrieval and generation (bypass with ?nocache=1)
+response_cache = TTLCache(maxsize=1024, ttl=600)
+
+def response_cache_key(endpoint: str, model_id: Optional[str], team_mode: Optional[str], query: str):
+    return (endpoint, model_id, team_mode, hashlib.blake2b(query.encode()).digest())
+
+def sse_event(payload: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+async def stream_events(run_stream, cache_key):
+    """Relay streamed agent output as server-sent events and cache the full answer once it completes, if non-empty."""
+    parts = []
+    try:
+        async for chunk in run_stream:
+            if isinstance(chunk.content, str) and chunk.content:
+                parts.append(chunk.content)
+                yield sse_event({"content": chunk.content})
+    except Exception as e:
+        yield sse_event({"detail": str(e)}, event="error")
+        return
+    content = "".join(parts)
+    if content:
+        response_cache[cache_key] = content
+    yield "data: [DONE]\n\n"
+
+async def replay_events(content: str):
+    yield sse_event({"content": content})
+    yield "data: [DONE]\n\n"
+
+def cached_response(content: str, stream: bool):
+    if stream:
+        return StreamingResponse(replay_events(content), media_type="text/event-stream")
+    return {"response": content}
+
+async def run_agent(agent, query: str, cache_key, stream: bool):
+    """Run the agent and either stream its answer as server-sent events or return it whole (?stream=0)."""
+    if stream:
+        run_stream = await agent.arun(query, stream=True)
+        return StreamingResponse(stream_events(run_stream, cache_key), media_type="text/event-stream")
+    response = await agent.arun(query)
+    # Only cache real answers; an empty or missing one should be retried, not replayed for ten minutes
+    if isinstance(response.content, str) and response.content:
+        response_cache[cache_key] = response.content
+    return {"response": response.content}
+
 # Endpoint to ask questions to the Safety Agent
-@app.post("/safety/ask")
-async def ask_safety_agent(request: QueryRequest):
+@app.post("/safety/ask", openapi_extra=request_body_schema(QueryRequestSchema))
+async def ask_safety_agent(raw_request: Request, nocache: bool = False, stream: bool = True):
+    request = await decode_request(raw_request, QueryRequest)
     try:
-        # Use the model_id if provided
-        if request.model_id:
-            model = OpenAIChat(id=request.model_id)
-            SafetyAgent.model = model
-            
-        response = SafetyAgent.run(request.query)
-        return {"response": response.content}
+        cache_key = response_cache_key("safety", request.model_id, None, request.query)
+        cached = None if nocache else response_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, stream)
+
+        # Run on a fresh agent (with the requested model, if any): agno keeps run state on the agent,
+        # so concurrent requests must not share one
+        agent = create_safety_agent(request.model_id)
+        return await run_agent(agent, request.query, cache_key, stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to ask questions to the Quality Agent
-@app.post("/quality/ask")
-async def ask_quality_agent(request: QueryRequest):
+@app.post("/quality/ask", openapi_extra=request_body_schema(QueryRequestSchema))
+async def ask_quality_agent(raw_request: Request, nocache: bool = False, stream: bool = True):
+    request = await decode_request(raw_request, QueryRequest)
     try:
-        # Use the model_id if provided
-        if request.model_id:
-            model = OpenAIChat(id=request.model_id)
-            QualityAgent.model = model
-            
-        response = QualityAgent.run(request.query)
-        return {"response": response.content}
+        cache_key = response_cache_key("quality", request.model_id, None, request.query)
+        cached = None if nocache else response_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, stream)
+
+        # Run on a fresh agent (with the requested model, if any): agno keeps run state on the agent,
+        # so concurrent requests must not share one
+        agent = create_quality_agent(request.model_id)
+        return await run_agent(agent, request.query, cache_key, stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to ask questions to the Team Agent
-@app.post("/team/ask")
-async def ask_team_agent(request: TeamQueryRequest):
-    try:
-        # Use the model_id if provided
-        if request.model_id:
-            model = OpenAIChat(id=request.model_id)
-            TeamAgent.model = model
+@app.post("/team/ask", openapi_extra=request_body_schema(TeamQueryRequestSchema))
+async def ask_team_agent(raw_request: Request, nocache: bool = False, stream: bool = True):
+    request = await decode_request(raw_request, TeamQueryRequest)
+    if request.team_mode not in TEAM_INSTRUCTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid team mode: {request.team_mode}. Must be one of: {', '.join(TEAM_INSTRUCTIONS.keys())}")
         
-        # Set the team mode and instructions
-        if request.team_mode in TEAM_INSTRUCTIONS:
-            TeamAgent.mode = request.team_mode
-            TeamAgent.instructions = TEAM_INSTRUCTIONS[request.team_mode]["instructions"]
-            TeamAgent.description = TEAM_INSTRUCTIONS[request.team_mode]["description"]
-        else:
-            raise HTTPException(status_code=400, detail=f"Invalid team mode: {request.team_mode}. Must be one of: {', '.join(TEAM_INSTRUCTIONS.keys())}")
-            
-        response = TeamAgent.run(request.query)
-        return {"response": response.content}
+    try:
+        cache_key = response_cache_key("team", request.model_id, request.team_mode, request.query)
+        cached = None if nocache else response_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, stream)
+
+        # Run on a fresh team (and members) for the requested mode and model, as for the single agents
+        team_agent = create_team(request.team_mode, request.model_id)
+
+        # The async path runs member agents concurrently (collaborate fans out to all members,
+        # coordinate dispatches parallel delegations together)
+        return await run_agent(team_agent, request.query, cache_key, stream)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1,9 +1,19 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import msgspec
 from typing import Dict, Any, Optional
+from cachetools import TTLCache
+import asyncio
+import hashlib
+import importlib
+import json
 import logging
 import os
+import sys
+import threading
+import time
 import traceback
 
 # Configure logging
@@ -26,50 +36,154 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Define request models
-class QueryRequest(BaseModel):
+# Define request models (decoded with msgspec, which is much cheaper than Pydantic validation)
+class QueryRequest(msgspec.Struct):
     query: str
     model_id: Optional[str] = None
 
-class TeamQueryRequest(BaseModel):
+class TeamQueryRequest(msgspec.Struct):
     query: str
     model_id: Optional[str] = None
     team_mode: Optional[str] = "collaborate"  # Default to collaborate, can be "route" or "coordinate"
 
-# Import the agents - wrapped in try/except to avoid startup failures
-try:
-    from agno.models.openai import OpenAIChat
-    from agents import SafetyAgent, QualityAgent, TeamAgent, AGENTS, TEAM_INSTRUCTIONS, are_agents_available
-    
-    # Print status of agent initialization
-    if are_agents_available():
-        logger.info("Agents successfully loaded")
-    else:
-        logger.warning("Agents were not initialized properly")
-        
-except ImportError as e:
-    logger.error(f"Error importing agent modules: {str(e)}")
-    # Create empty objects for graceful failure
-    AGENTS = {}
-    TEAM_INSTRUCTIONS = {}
-    SafetyAgent = None
-    QualityAgent = None
-    TeamAgent = None
-    
-    def are_agents_available():
-        return False
-        
-except Exception as e:
-    logger.error(f"Unexpected error loading agents: {str(e)}")
-    # Create empty objects for graceful failure
-    AGENTS = {}
-    TEAM_INSTRUCTIONS = {}
-    SafetyAgent = None
-    QualityAgent = None 
-    TeamAgent = None
-    
-    def are_agents_available():
-        return False
+# Pydantic shadow models, used only to document the request bodies in the OpenAPI schema
+class QueryRequestSchema(BaseModel):
+    query: str
+    model_id: Optional[str] = None
+
+class TeamQueryRequestSchema(BaseModel):
+    query: str
+    model_id: Optional[str] = None
+    team_mode: Optional[str] = "collaborate"
+
+def request_body_schema(schema_model):
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema_model.model_json_schema()}}}}
+
+async def decode_request(raw_request: Request, request_type):
+    """Decode and validate a JSON request body into request_type."""
+    try:
+        return msgspec.json.decode(await raw_request.body(), type=request_type)
+    except msgspec.DecodeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+# Import the agents lazily: initializing them connects to LanceDB, so keep it off the import path
+# and let a later request retry if it fails (e.g. LanceDB was briefly unreachable).
+# _agents_module is set only by load_agents, once initialization has succeeded.
+_agents_module = None
+_agents_lock = threading.Lock()
+_last_agents_attempt = None
+
+# Minimum seconds between initialization attempts after a failure, so an outage does not turn every
+# request into a LanceDB connection attempt
+AGENTS_RETRY_INTERVAL = float(os.environ.get("AGENTS_RETRY_INTERVAL", 30))
+
+def load_agents():
+    """Return the initialized agents module, or None if initialization failed. Blocks; call from a worker thread."""
+    global _agents_module, _last_agents_attempt
+    with _agents_lock:
+        if _agents_module is not None:
+            return _agents_module
+        if _last_agents_attempt is not None and time.monotonic() - _last_agents_attempt < AGENTS_RETRY_INTERVAL:
+            return None
+        _last_agents_attempt = time.monotonic()
+
+        try:
+            agents = importlib.import_module("agents")
+            if agents.are_agents_available():
+                _agents_module = agents
+                return agents
+            logger.warning("Agents were not initialized properly")
+        except (ImportError, ValueError) as e:
+            logger.error(f"Error importing agent modules: {str(e)}")
+        except Exception as e:
+            logger.error(f"Unexpected error loading agents: {str(e)}")
+
+        # Forget the failed attempt so the next call re-runs initialization
+        sys.modules.pop("agents", None)
+        return None
+
+async def aload_agents():
+    """Return the agents module, initializing it in a worker thread on first use."""
+    if _agents_module is not None:
+        return _agents_module
+    return await asyncio.to_thread(load_agents)
+
+def are_agents_available():
+    """Report whether the agents are ready without triggering initialization."""
+    return _agents_module is not None
+
+def warm_vector_db(vector_db):
+    """Run a throwaway search so LanceDB opens the table and loads index metadata before user traffic.
+
+    Vector-only on purpose: a hybrid search on a local table without an FTS index would rebuild that
+    index in every worker.
+    """
+    try:
+        vector_db.vector_search("warmup", limit=1)
+    except Exception as e:
+        logger.warning(f"Failed to warm up {vector_db.table_name}: {str(e)}")
+
+async def warm_up():
+    agents = await asyncio.to_thread(load_agents)
+    if agents is None:
+        return
+    await asyncio.gather(
+        asyncio.to_thread(warm_vector_db, agents.safety_vector_db),
+        asyncio.to_thread(warm_vector_db, agents.quality_vector_db),
+    )
+    logger.info("Agents and vector databases warmed up")
+
+# Warm the agents and vector databases in the background so the first user request does not pay for them
+@app.on_event("startup")
+async def warm_agents():
+    app.state.agents_warmup = asyncio.create_task(warm_up())
+
+# Cache of recent answers so repeated queries skip retrieval and generation (bypass with ?nocache=1)
+response_cache = TTLCache(maxsize=1024, ttl=600)
+
+def response_cache_key(endpoint: str, model_id: Optional[str], team_mode: Optional[str], query: str):
+    return (endpoint, model_id, team_mode, hashlib.blake2b(query.encode()).digest())
+
+def sse_event(payload: dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload)}\n\n"
+
+async def stream_events(run_stream, cache_key):
+    """Relay streamed agent output as server-sent events and cache the full answer once it completes, if non-empty."""
+    parts = []
+    try:
+        async for chunk in run_stream:
+            if isinstance(chunk.content, str) and chunk.content:
+                parts.append(chunk.content)
+                yield sse_event({"content": chunk.content})
+    except Exception as e:
+        logger.error(f"Error streaming agent response: {str(e)}")
+        yield sse_event({"detail": str(e)}, event="error")
+        return
+    content = "".join(parts)
+    if content:
+        response_cache[cache_key] = content
+    yield "data: [DONE]\n\n"
+
+async def replay_events(content: str):
+    yield sse_event({"content": content})
+    yield "data: [DONE]\n\n"
+
+def cached_response(content: str, stream: bool):
+    if stream:
+        return StreamingResponse(replay_events(content), media_type="text/event-stream")
+    return {"response": content}
+
+async def run_agent(agent, query: str, cache_key, stream: bool):
+    """Run the agent and either stream its answer as server-sent events or return it whole (?stream=0)."""
+    if stream:
+        run_stream = await agent.arun(query, stream=True)
+        return StreamingResponse(stream_events(run_stream, cache_key), media_type="text/event-stream")
+    response = await agent.arun(query)
+    # Only cache real answers; an empty or missing one should be retried, not replayed for ten minutes
+    if isinstance(response.content, str) and response.content:
+        response_cache[cache_key] = response.content
+    return {"response": response.content}
 
 # Diagnostic endpoint to check config without connecting to LanceDB
 @app.get("/config")
@@ -78,70 +192,76 @@ async def get_config():
         "lance_url": os.environ.get("LanceURL", "Not set"),
         "lance_api_key_set": bool(os.environ.get("LANCE_API_KEY")),
         "openai_api_key_set": bool(os.environ.get("OPENAI_API_KEY")),
-        "agents_available": are_agents_available() if 'are_agents_available' in globals() else False
+        "agents_available": are_agents_available()
     }
 
 # Endpoint to ask questions to the Safety Agent
-@app.post("/safety/ask")
-async def ask_safety_agent(request: QueryRequest):
-    if not SafetyAgent:
+@app.post("/safety/ask", openapi_extra=request_body_schema(QueryRequestSchema))
+async def ask_safety_agent(raw_request: Request, nocache: bool = False, stream: bool = True):
+    request = await decode_request(raw_request, QueryRequest)
+    agents = await aload_agents()
+    if agents is None:
         raise HTTPException(status_code=503, detail="Safety Agent is not available due to LanceDB connection issues")
         
     try:
-        # Use the model_id if provided
-        if request.model_id:
-            from agno.models.openai import OpenAIChat
-            model = OpenAIChat(id=request.model_id)
-            SafetyAgent.model = model
-            
-        response = SafetyAgent.run(request.query)
-        return {"response": response.content}
+        cache_key = response_cache_key("safety", request.model_id, None, request.query)
+        cached = None if nocache else response_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, stream)
+
+        # Run on a fresh agent (with the requested model, if any): agno keeps run state on the agent,
+        # so concurrent requests must not share one
+        agent = agents.create_safety_agent(request.model_id)
+        return await run_agent(agent, request.query, cache_key, stream)
     except Exception as e:
         logger.error(f"Error processing safety agent request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to ask questions to the Quality Agent
-@app.post("/quality/ask")
-async def ask_quality_agent(request: QueryRequest):
-    if not QualityAgent:
+@app.post("/quality/ask", openapi_extra=request_body_schema(QueryRequestSchema))
+async def ask_quality_agent(raw_request: Request, nocache: bool = False, stream: bool = True):
+    request = await decode_request(raw_request, QueryRequest)
+    agents = await aload_agents()
+    if agents is None:
         raise HTTPException(status_code=503, detail="Quality Agent is not available due to LanceDB connection issues")
         
     try:
-        # Use the model_id if provided
-        if request.model_id:
-            from agno.models.openai import OpenAIChat
-            model = OpenAIChat(id=request.model_id)
-            QualityAgent.model = model
-            
-        response = QualityAgent.run(request.query)
-        return {"response": response.content}
+        cache_key = response_cache_key("quality", request.model_id, None, request.query)
+        cached = None if nocache else response_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, stream)
+
+        # Run on a fresh agent (with the requested model, if any): agno keeps run state on the agent,
+        # so concurrent requests must not share one
+        agent = agents.create_quality_agent(request.model_id)
+        return await run_agent(agent, request.query, cache_key, stream)
     except Exception as e:
         logger.error(f"Error processing quality agent request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Endpoint to ask questions to the Team Agent
-@app.post("/team/ask")
-async def ask_team_agent(request: TeamQueryRequest):
-    if not TeamAgent:
+@app.post("/team/ask", openapi_extra=request_body_schema(TeamQueryRequestSchema))
+async def ask_team_agent(raw_request: Request, nocache: bool = False, stream: bool = True):
+    request = await decode_request(raw_request, TeamQueryRequest)
+    agents = await aload_agents()
+    if agents is None:
         raise HTTPException(status_code=503, detail="Team Agent is not available due to LanceDB connection issues")
         
-    try:
-        # Use the model_id if provided
-        if request.model_id:
-            from agno.models.openai import OpenAIChat
-            model = OpenAIChat(id=request.model_id)
-            TeamAgent.model = model
+    if request.team_mode not in agents.TEAM_INSTRUCTIONS:
+        raise HTTPException(status_code=400, detail=f"Invalid team mode: {request.team_mode}. Must be one of: {', '.join(agents.TEAM_INSTRUCTIONS.keys())}")
         
-        # Set the team mode and instructions
-        if request.team_mode in TEAM_INSTRUCTIONS:
-            TeamAgent.mode = request.team_mode
-            TeamAgent.instructions = TEAM_INSTRUCTIONS[request.team_mode]["instructions"]
-            TeamAgent.description = TEAM_INSTRUCTIONS[request.team_mode]["description"]
-        else:
-            raise HTTPException(status_code=400, detail=f"Invalid team mode: {request.team_mode}. Must be one of: {', '.join(TEAM_INSTRUCTIONS.keys())}")
-            
-        response = TeamAgent.run(request.query)
-        return {"response": response.content}
+    try:
+        cache_key = response_cache_key("team", request.model_id, request.team_mode, request.query)
+        cached = None if nocache else response_cache.get(cache_key)
+        if cached is not None:
+            return cached_response(cached, stream)
+
+        # Run on a fresh team (and members) for the requested mode and model, as for the single agents
+        team_agent = agents.create_team(request.team_mode, request.model_id)
+
+        # The async path runs member agents concurrently (collaborate fans out to all members,
+        # coordinate dispatches parallel delegations together)
+        return await run_agent(team_agent, request.query, cache_key, stream)
     except Exception as e:
         logger.error(f"Error processing team agent request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -149,8 +269,9 @@ async def ask_team_agent(request: TeamQueryRequest):
 # Health check endpoint
 @app.get("/health")
 async def health_check():
-    agents_status = "available" if (are_agents_available() if 'are_agents_available' in globals() else False) else "unavailable"
-    available_agents = list(AGENTS.keys()) if AGENTS else []
+    agents = _agents_module
+    agents_status = "available" if agents is not None else "unavailable"
+    available_agents = list(agents.AGENTS.keys()) if agents is not None else []
     
     return {
         "status": "healthy",
@@ -161,7 +282,7 @@ async def health_check():
 # Root endpoint with basic info
 @app.get("/")
 async def root():
-    agents_status = "available" if (are_agents_available() if 'are_agents_available' in globals() else False) else "unavailable"
+    agents_status = "available" if are_agents_available() else "unavailable"
     
     return {
         "app": "Standards Agents API",
@@ -177,10 +298,12 @@ async def root():
     }
 
 if __name__ == "__main__":
-    import asyncio
     import uvicorn
     # Get the port from the environment variable
     port = int(os.environ.get("PORT", 8080))
     logger.info(f"Starting server on port {port}")
-    # Disable uvloop to avoid conflict with nest_asyncio
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False, loop="asyncio") 
\ No newline at end of file
+    # One worker per core unless WEB_CONCURRENCY says otherwise
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    # uvloop is safe here: agents (and LanceDB) are initialized in a worker thread by load_agents,
+    # so nothing tries to nest_asyncio-patch the server's event loop
+    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False, workers=workers, loop="uvloop", http="httptools") 
\ No newline at end of file
@@ -1,7 +1,9 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Dict, Any, Optional
+import json
 
 # Create the FastAPI app
 app = FastAPI(
@@ -29,20 +31,27 @@ class TeamQueryRequest(BaseModel):
     model_id: Optional[str] = None
     team_mode: Optional[str] = "collaborate"
 
+# Mirror the real API: stream server-sent events by default, whole JSON with ?stream=0
+def respond(content: str, stream: bool):
+    if stream:
+        events = [f"data: {json.dumps({'content': content})}\n\n", "data: [DONE]\n\n"]
+        return StreamingResponse(iter(events), media_type="text/event-stream")
+    return {"response": content}
+
 # Endpoint to ask questions to the Safety Agent
 @app.post("/safety/ask")
-async def ask_safety_agent(request: QueryRequest):
-    return {"response": f"Safety response to: {request.query}"}
+async def ask_safety_agent(request: QueryRequest, stream: bool = True):
+    return respond(f"Safety response to: {request.query}", stream)
 
 # Endpoint to ask questions to the Quality Agent
 @app.post("/quality/ask")
-async def ask_quality_agent(request: QueryRequest):
-    return {"response": f"Quality response to: {request.query}"}
+async def ask_quality_agent(request: QueryRequest, stream: bool = True):
+    return respond(f"Quality response to: {request.query}", stream)
 
 # Endpoint to ask questions to the Team Agent
 @app.post("/team/ask")
-async def ask_team_agent(request: TeamQueryRequest):
-    return {"response": f"Team response ({request.team_mode}) to: {request.query}"}
+async def ask_team_agent(request: TeamQueryRequest, stream: bool = True):
+    return respond(f"Team response ({request.team_mode}) to: {request.query}", stream)
 
 # Health check endpoint
 @app.get("/health")
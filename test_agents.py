@@ -0,0 +1,229 @@
+import json
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import lancedb
+import pandas as pd
+import pyarrow as pa
+from lancedb.query import LanceHybridQueryBuilder, LanceVectorQueryBuilder
+from lancedb.table import LanceTable
+
+# agents.py connects to LanceDB on import; point it at a throwaway local database whose tables
+# already exist, so no embedding request is needed to infer the schema
+LANCE_DIR = tempfile.mkdtemp()
+os.environ["LanceURL"] = LANCE_DIR
+os.environ["LANCE_API_KEY"] = "test"
+os.environ["OPENAI_API_KEY"] = "test"
+os.environ["EMBEDDING_BATCH_STATE"] = os.path.join(LANCE_DIR, "batches.sqlite")
+
+SCHEMA = pa.schema([
+    pa.field("vector", pa.list_(pa.float32(), 1536)),
+    pa.field("id", pa.string()),
+    pa.field("payload", pa.string()),
+])
+for table_name in ("safety_standards", "quality_standards"):
+    lancedb.connect(LANCE_DIR).create_table(table_name, schema=SCHEMA, exist_ok=True)
+
+import agents
+
+
+class FakeRemoteTable:
+    """Stand-in for lancedb's RemoteTable, with the same create_index / create_fts_index signatures."""
+
+    def __init__(self, indices=()):
+        self.calls = []
+        self.indices = list(indices)
+
+    def list_indices(self):
+        return self.indices
+
+    def create_index(self, metric="l2", vector_column_name="vector", index_cache_size=None, num_partitions=None,
+                     num_sub_vectors=None, replace=None, accelerator=None, index_type="vector"):
+        self.calls.append(("create_index", metric, vector_column_name, index_type))
+
+    def create_fts_index(self, column, *, replace=False, with_position=True):
+        self.calls.append(("create_fts_index", column, replace))
+
+
+def fake_vector_db(table):
+    return SimpleNamespace(table=table, table_name="fake_standards", use_tantivy=True, fts_index_exists=False)
+
+
+class TestAgents(unittest.TestCase):
+    def test_agents_available(self):
+        """The agents initialize against the local test database"""
+        self.assertTrue(agents.are_agents_available())
+
+    def test_teams_have_own_members(self):
+        """Each team gets its own member agents, separate from the direct endpoint agents"""
+        teams = [agents.TeamAgent, agents.create_team("collaborate"), agents.create_team("route")]
+        members = [id(member) for team in teams for member in team.members]
+        self.assertEqual(len(set(members)), len(members))
+        self.assertNotIn(id(agents.SafetyAgent), members)
+        self.assertNotIn(id(agents.QualityAgent), members)
+
+    def test_create_team_with_model(self):
+        """A team for another model leaves the default team untouched"""
+        team = agents.create_team("route", "gpt-4o")
+        self.assertEqual([team.model.id] + [member.model.id for member in team.members], ["gpt-4o"] * 3)
+        self.assertEqual(agents.TeamAgent.model.id, agents.default_model_id)
+
+    def test_vector_index_on_remote_table(self):
+        """Remote tables get an HNSW index without the local-only tuning arguments"""
+        table = FakeRemoteTable()
+        agents.create_vector_index(fake_vector_db(table))
+        self.assertEqual(table.calls, [("create_index", "cosine", "vector", "IVF_HNSW_SQ")])
+
+    def test_existing_vector_index_is_kept(self):
+        """An existing HNSW index is not rebuilt (LanceDB Cloud would replace it)"""
+        table = FakeRemoteTable(indices=[SimpleNamespace(index_type="IVF_HNSW_SQ")])
+        agents.create_vector_index(fake_vector_db(table))
+        self.assertEqual(table.calls, [])
+
+    def test_searches_use_ef_search(self):
+        """Vector and hybrid searches pass HNSW_EF_SEARCH to LanceDB"""
+        vector_db = agents.safety_vector_db
+        with mock.patch.object(vector_db, "fts_index_exists", True), \
+                mock.patch.object(agents.shared_embedder, "get_embedding", return_value=[0.0] * 1536), \
+                mock.patch.object(LanceVectorQueryBuilder, "ef", autospec=True, side_effect=lambda query, ef: query) as vector_ef, \
+                mock.patch.object(LanceHybridQueryBuilder, "ef", autospec=True, side_effect=lambda query, ef: query) as hybrid_ef, \
+                mock.patch.object(LanceHybridQueryBuilder, "to_pandas", return_value=pd.DataFrame()):
+            self.assertEqual(vector_db.vector_search("query"), [])
+            self.assertEqual(vector_db.hybrid_search("query"), [])
+        self.assertEqual(vector_ef.call_args.args[1], agents.hnsw_ef_search)
+        self.assertEqual(hybrid_ef.call_args.args[1], agents.hnsw_ef_search)
+
+    def test_reload_without_new_documents_skips_vector_index(self):
+        """A reload that inserts nothing does not touch the vector index"""
+        with mock.patch.object(agents, "load_knowledge_base_batched", return_value=0), \
+                mock.patch.object(agents, "create_vector_index") as create_vector_index, \
+                mock.patch.object(agents, "create_fts_index"):
+            agents.load_knowledge_bases(reload_safety=True, reload_quality=True)
+        create_vector_index.assert_not_called()
+
+    def test_recreate_drops_table_before_loading(self):
+        """recreate=True drops the table and forgets its FTS index before loading"""
+        vector_db = mock.Mock(table_name="fake_standards", fts_index_exists=True)
+        vector_db.exists.return_value = False
+        knowledge_base = SimpleNamespace(vector_db=vector_db, document_lists=[])
+        self.assertEqual(agents.load_knowledge_base_batched(knowledge_base, recreate=True), 0)
+        self.assertEqual([call[0] for call in vector_db.method_calls], ["drop", "exists", "create"])
+        self.assertFalse(vector_db.fts_index_exists)
+
+    def test_vector_index_on_local_table(self):
+        """Local tables get the HNSW_M / HNSW_EF_CONSTRUCTION tuning"""
+        table = mock.create_autospec(LanceTable, instance=True)
+        agents.create_vector_index(fake_vector_db(table))
+        table.create_index.assert_called_once_with(
+            metric="cosine",
+            vector_column_name="vector",
+            index_type="IVF_HNSW_SQ",
+            m=agents.hnsw_m,
+            ef_construction=agents.hnsw_ef_construction,
+            replace=False,
+        )
+
+    def test_fts_index_on_remote_table(self):
+        """Remote tables get an FTS index without use_tantivy"""
+        table = FakeRemoteTable()
+        vector_db = fake_vector_db(table)
+        agents.create_fts_index(vector_db)
+        self.assertEqual(table.calls, [("create_fts_index", "payload", True)])
+        self.assertTrue(vector_db.fts_index_exists)
+
+    def test_has_fts_index_finds_tantivy_index(self):
+        """A local tantivy FTS index is detected even though list_indices() does not report it"""
+        db = lancedb.connect(LANCE_DIR)
+        table = db.create_table("fts_check", data=[{"vector": [0.0] * 1536, "id": "1", "payload": "fire safety"}], schema=SCHEMA)
+        self.addCleanup(db.drop_table, "fts_check")
+        vector_db = fake_vector_db(table)
+        self.assertFalse(agents.has_fts_index(vector_db))
+        table.create_fts_index("payload", use_tantivy=True)
+        self.assertTrue(agents.has_fts_index(vector_db))
+
+    def test_has_fts_index_on_remote_table(self):
+        """Remote tables report their FTS index through list_indices()"""
+        self.assertFalse(agents.has_fts_index(fake_vector_db(FakeRemoteTable())))
+        table = FakeRemoteTable(indices=[SimpleNamespace(index_type="FTS")])
+        self.assertTrue(agents.has_fts_index(fake_vector_db(table)))
+
+    def test_fts_index_on_local_table(self):
+        """Local tables keep the configured use_tantivy setting"""
+        table = mock.create_autospec(LanceTable, instance=True)
+        agents.create_fts_index(fake_vector_db(table))
+        table.create_fts_index.assert_called_once_with("payload", replace=True, use_tantivy=True)
+
+
+class FakeBatchClient:
+    """Minimal OpenAI client for the files/batches calls made by embed_with_batch_api."""
+
+    def __init__(self, output_text=None):
+        self.output_text = output_text
+        self.inputs = []
+        self.files = SimpleNamespace(create=self.create_file, content=self.file_content)
+        self.batches = SimpleNamespace(create=self.create_batch, retrieve=self.retrieve_batch)
+
+    def create_file(self, file, purpose):
+        self.inputs.append(file[1].decode().splitlines())
+        return SimpleNamespace(id=f"file-{len(self.inputs)}")
+
+    def create_batch(self, input_file_id, endpoint, completion_window):
+        return self.retrieve_batch(f"batch-{input_file_id}")
+
+    def retrieve_batch(self, batch_id):
+        output_file_id = None if self.output_text is None else "output"
+        return SimpleNamespace(id=batch_id, status="completed", output_file_id=output_file_id)
+
+    def file_content(self, file_id):
+        return SimpleNamespace(text=self.output_text)
+
+
+class TestBatchEmbedding(unittest.TestCase):
+    def setUp(self):
+        self.embedder = agents.BatchedOpenAIEmbedder(id="text-embedding-3-small", batch_size=2)
+
+    def pending_parts(self):
+        with agents.closing(agents.sqlite3.connect(agents.embedding_batch_state_path)) as state:
+            return state.execute("SELECT part FROM batch_jobs").fetchall()
+
+    def test_query_embeddings_cached_compactly(self):
+        """Repeated queries hit the float32 cache instead of the embeddings API"""
+        with mock.patch.object(agents.OpenAIEmbedder, "get_embedding", return_value=[0.25, 0.5]) as get_embedding:
+            self.assertEqual(self.embedder.get_embedding("query"), [0.25, 0.5])
+            self.assertEqual(self.embedder.get_embedding("query"), [0.25, 0.5])
+        get_embedding.assert_called_once_with("query")
+        (cached,) = self.embedder.cache.values()
+        self.assertEqual(cached.typecode, "f")
+
+    def test_jobs_respect_input_limit(self):
+        """Texts are split into several jobs once a job would exceed the input limit"""
+        client = FakeBatchClient(output_text="")
+        self.embedder.openai_client = client
+        with mock.patch.object(agents, "embedding_batch_max_inputs", 4):
+            agents.embed_with_batch_api(self.embedder, "split", [f"text {i}" for i in range(10)])
+        self.assertEqual([len(lines) for lines in client.inputs], [2, 2, 1])
+        custom_ids = [json.loads(line)["custom_id"] for lines in client.inputs for line in lines]
+        self.assertEqual(custom_ids, ["0", "1", "2", "3", "4"])
+        self.assertEqual(self.pending_parts(), [])
+
+    def test_completed_batch_without_output(self):
+        """A completed job with no output file falls back to per-request embedding and is cleared"""
+        client = FakeBatchClient(output_text=None)
+        self.embedder.openai_client = client
+        agents.embed_with_batch_api(self.embedder, "no-output", ["a", "b", "c"])
+        self.assertEqual(self.embedder.prefetched, {})
+        self.assertEqual(self.pending_parts(), [])
+
+    def test_output_is_prefetched(self):
+        """Embeddings from the output file are matched back to their texts"""
+        output = json.dumps({"custom_id": "1", "response": {"status_code": 200, "body": {"data": [{"index": 0, "embedding": [0.5]}]}}})
+        self.embedder.openai_client = FakeBatchClient(output_text=output)
+        agents.embed_with_batch_api(self.embedder, "output", ["a", "b", "c"])
+        self.assertEqual(self.embedder.prefetched, {"c": [0.5]})
+
+
+if __name__ == "__main__":
+    unittest.main()
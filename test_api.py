@@ -1,59 +1,89 @@
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import json
 import unittest
 
+# Share one keep-alive connection pool across all tests
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.headers["Connection"] = "keep-alive"
+
+# Ask endpoints stream by default; request whole JSON answers instead
+NO_STREAM = {"stream": 0}
+
+# Seconds to wait for a response; agent answers can take a while, but a stuck server must not hang the suite
+REQUEST_TIMEOUT = 300
+
 class TestFastAPI(unittest.TestCase):
     BASE_URL = "http://localhost:8080"
-    
+
+    @classmethod
+    def setUpClass(cls):
+        """Send every request concurrently up front; each test then checks its own response"""
+        safety_payload = {
+            "query": "What are basic safety protocols?",
+            "model_id": "o3-mini"
+        }
+        quality_payload = {
+            "query": "What is quality assurance?",
+            "model_id": "o3-mini"
+        }
+        team_payload = {
+            "query": "Tell me about safety and quality standards.",
+            "model_id": "o3-mini",
+            "team_mode": "collaborate"
+        }
+        calls = {
+            "health": lambda: SESSION.get(f"{cls.BASE_URL}/health", timeout=REQUEST_TIMEOUT),
+            "root": lambda: SESSION.get(f"{cls.BASE_URL}/", timeout=REQUEST_TIMEOUT),
+            "safety": lambda: SESSION.post(f"{cls.BASE_URL}/safety/ask", params=NO_STREAM, json=safety_payload, timeout=REQUEST_TIMEOUT),
+            "quality": lambda: SESSION.post(f"{cls.BASE_URL}/quality/ask", params=NO_STREAM, json=quality_payload, timeout=REQUEST_TIMEOUT),
+            "team": lambda: SESSION.post(f"{cls.BASE_URL}/team/ask", params=NO_STREAM, json=team_payload, timeout=REQUEST_TIMEOUT),
+        }
+        cls.executor = ThreadPoolExecutor(max_workers=len(calls))
+        cls.responses = {name: cls.executor.submit(call) for name, call in calls.items()}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
     def test_health_endpoint(self):
         """Test the health endpoint returns healthy status"""
-        response = requests.get(f"{self.BASE_URL}/health")
+        response = self.responses["health"].result()
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertEqual(data["status"], "healthy")
         self.assertIn("agents", data)
-        
+
     def test_root_endpoint(self):
         """Test the root endpoint returns API info"""
-        response = requests.get(f"{self.BASE_URL}/")
+        response = self.responses["root"].result()
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertIn("app", data)
         self.assertIn("version", data)
         self.assertIn("endpoints", data)
-    
+
     def test_safety_agent(self):
         """Test the safety agent endpoint with a basic query"""
-        payload = {
-            "query": "What are basic safety protocols?",
-            "model_id": "o3-mini"
-        }
-        response = requests.post(f"{self.BASE_URL}/safety/ask", json=payload)
+        response = self.responses["safety"].result()
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertIn("response", data)
         self.assertTrue(len(data["response"]) > 0)
-    
+
     def test_quality_agent(self):
         """Test the quality agent endpoint with a basic query"""
-        payload = {
-            "query": "What is quality assurance?",
-            "model_id": "o3-mini"
-        }
-        response = requests.post(f"{self.BASE_URL}/quality/ask", json=payload)
+        response = self.responses["quality"].result()
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertIn("response", data)
         self.assertTrue(len(data["response"]) > 0)
-    
+
     def test_team_agent(self):
         """Test the team agent endpoint with a basic query"""
-        payload = {
-            "query": "Tell me about safety and quality standards.",
-            "model_id": "o3-mini",
-            "team_mode": "collaborate"
-        }
-        response = requests.post(f"{self.BASE_URL}/team/ask", json=payload)
+        response = self.responses["team"].result()
         self.assertEqual(response.status_code, 200)
         data = response.json()
         self.assertIn("response", data)
@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+
+import main
+
+
+class StubAgent:
+    """Agent that, like agno's, keeps the current run's state on the instance."""
+
+    def __init__(self, model_id=None):
+        self.model_id = model_id
+        self.run_query = None
+
+    async def arun(self, query, stream=False):
+        self.run_query = query
+        if stream:
+            return self.stream_answer()
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(content=f"answer to {self.run_query}")
+
+    async def stream_answer(self):
+        await asyncio.sleep(0.05)
+        yield SimpleNamespace(content=f"answer to {self.run_query}")
+
+
+STUB_AGENTS = SimpleNamespace(
+    create_safety_agent=StubAgent,
+    create_quality_agent=StubAgent,
+    create_team=lambda mode, model_id=None: StubAgent(model_id),
+    TEAM_INSTRUCTIONS={"collaborate": {}, "route": {}, "coordinate": {}},
+)
+
+
+async def load_stub_agents():
+    return STUB_AGENTS
+
+
+class AgentEndpointTestCase(unittest.IsolatedAsyncioTestCase):
+    """Calls the API in-process with the stub agents in place of agents.py."""
+
+    async def asyncSetUp(self):
+        patcher = mock.patch.object(main, "aload_agents", load_stub_agents)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        main.response_cache.clear()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test")
+        self.addAsyncCleanup(self.client.aclose)
+
+    async def ask(self, path, query, **payload):
+        response = await self.client.post(path, params={"stream": 0}, json={"query": query, **payload})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["response"]
+
+
+class TestConcurrentRequests(AgentEndpointTestCase):
+    async def test_overlapping_requests_get_their_own_answers(self):
+        """Two overlapping requests to each endpoint do not mix up their answers"""
+        for path, payload in (("/safety/ask", {}), ("/quality/ask", {}), ("/team/ask", {"team_mode": "route"})):
+            with self.subTest(path=path):
+                first, second = await asyncio.gather(
+                    self.ask(path, "first question", **payload),
+                    self.ask(path, "second question", **payload),
+                )
+                self.assertEqual(first, "answer to first question")
+                self.assertEqual(second, "answer to second question")
+
+    async def test_overlapping_streams_get_their_own_answers(self):
+        """Two overlapping streamed requests do not mix up their answers"""
+        async def ask_streamed(query):
+            response = await self.client.post("/safety/ask", json={"query": query})
+            return response.text
+
+        first, second = await asyncio.gather(ask_streamed("first question"), ask_streamed("second question"))
+        self.assertIn("answer to first question", first)
+        self.assertIn("answer to second question", second)
+
+
+class EmptyAgent(StubAgent):
+    async def arun(self, query, stream=False):
+        if stream:
+            return self.stream_answer()
+        return SimpleNamespace(content=None)
+
+    async def stream_answer(self):
+        yield SimpleNamespace(content="")
+
+
+class TestResponseCache(AgentEndpointTestCase):
+    async def test_empty_answers_are_not_cached(self):
+        """Empty answers, streamed or whole, never land in the response cache"""
+        with mock.patch.object(STUB_AGENTS, "create_safety_agent", EmptyAgent):
+            await self.client.post("/safety/ask", json={"query": "streamed"})
+            await self.client.post("/safety/ask", params={"stream": 0}, json={"query": "whole"})
+        self.assertEqual(len(main.response_cache), 0)
+
+    async def test_answers_are_cached(self):
+        """Non-empty answers are cached for both response styles"""
+        await self.ask("/safety/ask", "whole")
+        await self.client.post("/safety/ask", json={"query": "streamed"})
+        self.assertEqual(sorted(main.response_cache.values()), ["answer to streamed", "answer to whole"])
+
+
+class TestAgentLoading(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.multiple(main, _agents_module=None, _last_agents_attempt=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failed_load_is_throttled(self):
+        """After a failed initialization, further attempts wait for the retry interval"""
+        with mock.patch.object(main.importlib, "import_module", side_effect=ImportError("LanceDB unreachable")) as import_module:
+            self.assertIsNone(main.load_agents())
+            self.assertIsNone(main.load_agents())
+            self.assertEqual(import_module.call_count, 1)
+            self.assertFalse(main.are_agents_available())
+
+            with mock.patch.object(main, "AGENTS_RETRY_INTERVAL", 0):
+                self.assertIsNone(main.load_agents())
+            self.assertEqual(import_module.call_count, 2)
+
+    def test_warm_up_uses_vector_search(self):
+        """Warm-up never runs a hybrid search, which could rebuild a missing FTS index"""
+        vector_db = mock.Mock(spec=["vector_search", "search", "table_name"])
+        main.warm_vector_db(vector_db)
+        vector_db.vector_search.assert_called_once_with("warmup", limit=1)
+        vector_db.search.assert_not_called()
+
+    def test_successful_load_is_kept(self):
+        """Once loaded, the agents module is reused without importing again"""
+        module = SimpleNamespace(are_agents_available=lambda: True)
+        with mock.patch.object(main.importlib, "import_module", return_value=module) as import_module:
+            self.assertIs(main.load_agents(), module)
+            self.assertIs(main.load_agents(), module)
+            self.assertTrue(main.are_agents_available())
+        self.assertEqual(import_module.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()